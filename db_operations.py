@@ -1,15 +1,88 @@
 import aiosqlite
+import asyncio
 import time
-from datetime import datetime
-from typing import List, Dict, Any, Optional
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+# 每个连接都需要设置的 PRAGMA（journal_mode=WAL 会持久化到数据库文件，只需在 init_db 设置一次）
+CONNECTION_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-64000',     # 64MB 页缓存
+    'PRAGMA mmap_size=268435456',   # 256MB 内存映射
+    'PRAGMA wal_autocheckpoint=10000',
+)
+
+# 查询结果的列名，按位置与 SELECT 对应
+TOKEN_COLS = ('ca', 'token', 'initial_mcap', 'last_alert_time', 'received_time', 'sourceType')
+TOKEN_STATS_COLS = ('ca', 'token', 'initial_mcap', 'created_at', 'alert_count')
+
+# 代币精度换算表：_POW10[decimal] == 10 ** decimal（SPL 代币的 decimals 是 u8，覆盖 0-255）
+_POW10 = tuple(10.0 ** i for i in range(256))
+
+# 定期执行 PRAGMA optimize，让查询规划器的统计信息保持最新
+OPTIMIZE_INTERVAL = 15 * 60
+# 每天截断一次 WAL 文件，避免其无限增长
+CHECKPOINT_INTERVAL = 24 * 60 * 60
 
 class TokenDB:
     def __init__(self, db_path: str = 'tokens.db'):
         self.db_path = db_path
+        self._db: Optional[aiosqlite.Connection] = None
+        # 所有写操作共用一个连接，用锁保证 execute + commit 不被其他写操作打断
+        self._write_lock = asyncio.Lock()
+        # 已提醒过的 (ca, 倍数)，init_db 时从数据库加载，避免每轮监控都查库
+        self._alerted: Set[Tuple[str, int]] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    async def connect(self):
+        """打开长连接并应用连接级 PRAGMA"""
+        if self._db is not None:
+            return
+        self._db = await aiosqlite.connect(self.db_path)
+        for pragma in CONNECTION_PRAGMAS:
+            await self._db.execute(pragma)
+        self._tasks = [
+            asyncio.create_task(self._pragma_loop('PRAGMA optimize', OPTIMIZE_INTERVAL)),
+            asyncio.create_task(self._pragma_loop('PRAGMA wal_checkpoint(TRUNCATE)', CHECKPOINT_INTERVAL)),
+        ]
+
+    async def close(self):
+        """停止后台维护任务并关闭长连接"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    @asynccontextmanager
+    async def _writing(self):
+        """获取写锁并返回长连接，出错时回滚未提交的修改"""
+        async with self._write_lock:
+            try:
+                yield self._db
+            except BaseException:
+                await self._db.rollback()
+                raise
+
+    @staticmethod
+    async def _ensure_column(db: aiosqlite.Connection, table: str, column: str, decl: str):
+        """旧库缺少列时补上"""
+        async with db.execute(f'PRAGMA table_info({table})') as cursor:
+            columns = {row[1] for row in await cursor.fetchall()}
+        if column not in columns:
+            await db.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
 
     async def init_db(self):
         """初始化数据库"""
-        async with aiosqlite.connect(self.db_path) as db:
+        await self.connect()
+        async with self._writing() as db:
+            # WAL 模式：读写并发，减少 fsync 次数
+            await db.execute('PRAGMA journal_mode=WAL')
+
             # 代币基本信息表
             await db.execute('''
             CREATE TABLE IF NOT EXISTS monitored_tokens (
@@ -19,8 +92,33 @@ class TokenDB:
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 last_alert_time INTEGER DEFAULT 0,
                 received_time TEXT,
-                sourceType TEXT  -- 新增 sourceType 列
+                sourceType TEXT,  -- 新增 sourceType 列
+                created_at_ts INTEGER  -- created_at 的 Unix 秒，由触发器维护
             )''')
+            await self._ensure_column(db, 'monitored_tokens', 'created_at_ts', 'INTEGER')
+
+            # 72小时扫描按 received_time 走范围查询
+            await db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mt_received_time
+            ON monitored_tokens (received_time)''')
+
+            # 24小时统计按整数时间戳 created_at_ts 做范围过滤
+            await db.execute('''
+            CREATE INDEX IF NOT EXISTS idx_mt_created_at_ts
+            ON monitored_tokens (created_at_ts)''')
+            await db.execute('''
+            CREATE TRIGGER IF NOT EXISTS trg_mt_created_at_ts
+            AFTER INSERT ON monitored_tokens
+            BEGIN
+                UPDATE monitored_tokens
+                SET created_at_ts = CAST(strftime('%s', NEW.created_at) AS INTEGER)
+                WHERE rowid = NEW.rowid;
+            END''')
+            # 回填旧数据
+            await db.execute('''
+            UPDATE monitored_tokens
+            SET created_at_ts = CAST(strftime('%s', created_at) AS INTEGER)
+            WHERE created_at_ts IS NULL''')
             
             # 代币涨幅提醒记录表
             await db.execute('''
@@ -28,9 +126,11 @@ class TokenDB:
                 ca TEXT,
                 multiple INTEGER,  -- 3, 5, 10, 20, 50, 100
                 alert_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                max_market_cap REAL,  -- 提醒时的市值
                 PRIMARY KEY (ca, multiple),
                 FOREIGN KEY (ca) REFERENCES monitored_tokens(ca)
             )''')
+            await self._ensure_column(db, 'multiple_alerts', 'max_market_cap', 'REAL')
             
             # 创建价格历史记录表
             await db.execute('''
@@ -69,56 +169,63 @@ class TokenDB:
             
             await db.commit()
 
+            # 为查询规划器收集统计信息
+            await db.execute('ANALYZE')
+            await db.commit()
+
+            async with db.execute('SELECT ca, multiple FROM multiple_alerts') as cursor:
+                self._alerted = {(ca, multiple) for ca, multiple in await cursor.fetchall()}
+
     async def add_token(self, token: str, ca: str, initial_mcap: float, received_time: str, source_type: str) -> bool:
         """添加代币到监控列表（只记录第一次）"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
-                # 检查是否已存在
-                async with db.execute('SELECT 1 FROM monitored_tokens WHERE ca = ?', (ca,)) as cursor:
-                    if await cursor.fetchone() is None:
-                        # 不存在才插入
-                        await db.execute('''
-                        INSERT INTO monitored_tokens (ca, token, initial_mcap, received_time, sourceType)
-                        VALUES (?, ?, ?, ?, ?)
-                        ''', (ca, token, initial_mcap, received_time, source_type))
-                        await db.commit()
-                        print(f"✅ 新增代币: {token}")
-                        return True
-                    else:
-                        print(f"⏭️ 代币已存在，跳过: {token}")
-                        return False
+            async with self._writing() as db:
+                # ca 是主键，已存在时 INSERT OR IGNORE 不会插入
+                cursor = await db.execute('''
+                INSERT OR IGNORE INTO monitored_tokens (ca, token, initial_mcap, received_time, sourceType)
+                VALUES (?, ?, ?, ?, ?)
+                ''', (ca, token, initial_mcap, received_time, source_type))
+                await db.commit()
+                if cursor.rowcount == 1:
+                    print(f"✅ 新增代币: {token}")
+                    return True
+                else:
+                    print(f"⏭️ 代币已存在，跳过: {token}")
+                    return False
         except Exception as e:
             print(f"❌ 添加代币失败: {str(e)}")
             return False
 
     async def get_all_tokens(self) -> List[Dict[str, Any]]:
         """获取72小时内的所有监控中的代币"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute('''
-            SELECT ca, token, initial_mcap, last_alert_time, received_time, sourceType
-            FROM monitored_tokens
-            WHERE datetime(received_time) > datetime('now', '-72 hours')
-            ''') as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows]
+        db = self._db
+        # 直接比较文本时间，避免 datetime() 包裹导致索引失效
+        cutoff = (datetime.now(timezone.utc) - timedelta(hours=72)).strftime('%Y-%m-%d %H:%M:%S')
+        async with db.execute('''
+        SELECT ca, token, initial_mcap, last_alert_time, received_time, sourceType
+        FROM monitored_tokens
+        WHERE received_time > ?
+        ''', (cutoff,)) as cursor:
+            rows = await cursor.fetchall()
+            return [dict(zip(TOKEN_COLS, row)) for row in rows]
 
     async def record_alert(self, ca: str, multiple: int) -> bool:
         """记录价格提醒"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._writing() as db:
+                # 两条语句放在同一个事务里，只提交一次
+                await db.execute('BEGIN IMMEDIATE')
                 await db.execute('''
-                INSERT INTO price_alerts (ca, multiple)
+                INSERT INTO multiple_alerts (ca, multiple)
                 VALUES (?, ?)
                 ''', (ca, multiple))
-                
                 await db.execute('''
                 UPDATE monitored_tokens
                 SET last_alert_time = ?
                 WHERE ca = ?
                 ''', (int(time.time()), ca))
-                
                 await db.commit()
+                self._alerted.add((ca, multiple))
                 return True
         except Exception as e:
             print(f"记录提醒失败: {str(e)}")
@@ -126,31 +233,28 @@ class TokenDB:
 
     async def get_token_stats(self) -> List[Dict[str, Any]]:
         """获取代币统计信息"""
-        async with aiosqlite.connect(self.db_path) as db:
-            db.row_factory = aiosqlite.Row
-            async with db.execute('''
-            SELECT t.ca, t.token, t.initial_mcap, t.created_at,
-                   COUNT(DISTINCT p.multiple) as alert_count
-            FROM monitored_tokens t
-            LEFT JOIN price_alerts p ON t.ca = p.ca
-            GROUP BY t.ca
-            ''') as cursor:
-                rows = await cursor.fetchall()
-                return [dict(row) for row in rows] 
-
-    async def check_multiple_alerted(self, ca: str, multiple: int) -> bool:
+        db = self._db
+        async with db.execute('''
+        SELECT t.ca, t.token, t.initial_mcap, t.created_at,
+               COUNT(DISTINCT p.multiple) as alert_count
+        FROM monitored_tokens t
+        LEFT JOIN multiple_alerts p ON t.ca = p.ca
+        GROUP BY t.ca
+        ''') as cursor:
+            rows = await cursor.fetchall()
+            return [dict(zip(TOKEN_STATS_COLS, row)) for row in rows]
+
+    def check_multiple_alerted(self, ca: str, multiple: int) -> bool:
         """检查特定倍数是否已经提醒过"""
-        async with aiosqlite.connect(self.db_path) as db:
-            async with db.execute(
-                'SELECT 1 FROM multiple_alerts WHERE ca = ? AND multiple = ?',
-                (ca, multiple)
-            ) as cursor:
-                return await cursor.fetchone() is not None
+        return (ca, multiple) in self._alerted
 
     async def record_multiple_alert(self, ca: str, multiple: int, max_market_cap: float) -> bool:
         """记录新的倍数提醒"""
+        key = (ca, multiple)
+        # 先更新内存集合，后续检查立即生效
+        self._alerted.add(key)
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._writing() as db:
                 await db.execute(
                     'INSERT INTO multiple_alerts (ca, multiple, max_market_cap) VALUES (?, ?, ?)',
                     (ca, multiple, max_market_cap)
@@ -158,34 +262,63 @@ class TokenDB:
                 await db.commit()
                 return True
         except Exception as e:
+            if not isinstance(e, aiosqlite.IntegrityError):
+                # 没有落库（不是因为已存在），允许下一轮重新提醒
+                self._alerted.discard(key)
             print(f"记录倍数提醒失败: {str(e)}")
             return False 
 
+    @staticmethod
+    def price_row(ca: str, dex_data: dict) -> tuple:
+        """把 DexScreener 数据转换为 price_history 的一行（缺失或为 null 的字段记为 0）"""
+        # 获取第一个交易对的数据（通常是最主要的）
+        pair = dex_data['pairs'][0]
+        return (
+            ca,
+            float(pair.get('priceUsd') or 0),
+            float(pair.get('priceNative') or 0),
+            (pair.get('volume') or {}).get('h24') or 0,
+            pair.get('fdv') or 0,
+            pair.get('marketCap') or 0,
+            (pair.get('liquidity') or {}).get('usd') or 0
+        )
+
     async def add_price_record(self, ca: str, dex_data: dict) -> bool:
-        """添加价格记录"""
+        """添加单条价格记录（监控循环按轮用 add_price_records_bulk 批量写入）"""
         try:
-            # 获取第一个交易对的数据（通常是最主要的）
-            pair = dex_data['pairs'][0]
-            
-            async with aiosqlite.connect(self.db_path) as db:
-                await db.execute('''
+            row = self.price_row(ca, dex_data)
+        except Exception as e:
+            print(f"记录价格数据时出错: {str(e)}")
+            return False 
+        return await self.add_price_records_bulk([row])
+
+    async def add_price_records_bulk(self, rows: List[tuple]) -> bool:
+        """在一个事务内批量写入价格记录（rows 由 price_row 生成）"""
+        if not rows:
+            return True
+        try:
+            async with self._writing() as db:
+                await db.executemany('''
                 INSERT INTO price_history 
                 (ca, price_usd, price_native, volume_24h, fdv, market_cap, liquidity_usd)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
-                ''', (
-                    ca,
-                    float(pair.get('priceUsd', 0)),
-                    float(pair.get('priceNative', 0)),
-                    pair.get('volume', {}).get('h24', 0),
-                    pair.get('fdv', 0),
-                    pair.get('marketCap', 0),
-                    pair.get('liquidity', {}).get('usd', 0)
-                ))
+                ''', rows)
                 await db.commit()
                 return True
         except Exception as e:
-            print(f"记录价格数据时出错: {str(e)}")
-            return False 
+            print(f"批量写入价格数据时出错: {str(e)}")
+            return False
+
+    async def _pragma_loop(self, pragma: str, interval: float):
+        """定时执行维护用的 PRAGMA（持有写锁，保证没有未提交的事务）"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with self._writing() as db:
+                    await db.execute(pragma)
+                    await db.commit()
+            except Exception as e:
+                print(f"{pragma} 出错: {str(e)}")
 
     async def add_purchase_record(self, quote_data: dict, ca: str) -> bool:
         """添加购买记录"""
@@ -195,7 +328,7 @@ class TokenDB:
             to_token = data['toToken']
             dex_info = data['quoteCompareList'][0] if data['quoteCompareList'] else None
             
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._writing() as db:
                 await db.execute('''
                 INSERT INTO purchase_records (
                     ca,
@@ -212,10 +345,10 @@ class TokenDB:
                 ''', (
                     ca,
                     from_token['tokenSymbol'],
-                    float(data['fromTokenAmount']) / (10 ** int(from_token['decimal'])),
+                    float(data['fromTokenAmount']) / _POW10[int(from_token['decimal'])],
                     float(from_token['tokenUnitPrice']),
                     to_token['tokenSymbol'],
-                    float(data['toTokenAmount']) / (10 ** int(to_token['decimal'])),
+                    float(data['toTokenAmount']) / _POW10[int(to_token['decimal'])],
                     float(to_token['tokenUnitPrice']),
                     float(data['priceImpactPercentage']),
                     float(data['tradeFee']),
@@ -230,7 +363,7 @@ class TokenDB:
     async def update_purchase_status(self, record_id: int, status: str, tx_hash: str = None) -> bool:
         """更新购买记录状态"""
         try:
-            async with aiosqlite.connect(self.db_path) as db:
+            async with self._writing() as db:
                 if tx_hash:
                     await db.execute('''
                     UPDATE purchase_records 
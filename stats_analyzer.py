@@ -1,17 +1,38 @@
 from datetime import datetime, timedelta, timezone
+import asyncio
 import sqlite3
-import schedule
-import time
-import requests
+import aiohttp
+import numpy as np
+
+# UTC 小时 -> 北京时间小时（+8小时）
+_BEIJING_HOUR = tuple(f"{(i + 8) % 24:02d}" for i in range(24))
+
+# get_24h_stats 返回的结构化数组：每个 (UTC 小时, 代币) 一行
+_STATS_DTYPE = [('hour', 'i8'), ('token', 'O'), ('multiple', 'f8'), ('market_cap', 'f8')]
 
 class StatsAnalyzer:
     # 放到服务器上需要修改 tokens.db
     def __init__(self, db_path='tokens.db'):
         self.db_path = db_path
+        # 只读长连接：不与 TokenDB 的写入争抢写锁，页缓存在多次统计间复用
+        self._ro = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+        self._ro.execute('PRAGMA query_only=1')
+        self._ro.execute('PRAGMA cache_size=-32000')
+        # aiohttp 会话需要在事件循环中创建，首次发送时再初始化
+        self._session = None
         self.feishu_webhook = "https://open.feishu.cn/open-apis/bot/v2/hook/d6548b76-2bd9-449c-be50-8cfafcb30b19"
 
-    def send_to_feishu(self, text):
+    async def close(self):
+        """关闭飞书会话和只读连接"""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+        self._ro.close()
+
+    async def send_to_feishu(self, text):
         """发送消息到飞书"""
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=5))
         data = {
             "msg_type": "text",
             "content": {
@@ -19,155 +40,106 @@ class StatsAnalyzer:
             }
         }
         try:
-            response = requests.post(self.feishu_webhook, json=data)
-            if response.status_code == 200:
-                print("飞书消息发送成功")
-            else:
-                print(f"飞书消息发送失败: {response.status_code}")
+            async with self._session.post(self.feishu_webhook, json=data) as response:
+                if response.status == 200:
+                    print("飞书消息发送成功")
+                else:
+                    print(f"飞书消息发送失败: {response.status}")
         except Exception as e:
             print(f"发送飞书消息时出错: {str(e)}")
 
     def get_24h_stats(self):
-        """获取过去24小时内每个小时的创建次数和涨幅"""
+        """获取过去24小时内每个小时创建的代币及其最大倍数、最高市值"""
         # now = datetime.now()
         # yesterday = now - timedelta(days=1)
         now_utc = datetime.now(timezone.utc)
         yesterday_utc = now_utc - timedelta(days=1)
         
-        
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cursor = self._ro.cursor()
         
         try:
+            # 每个 (小时, 代币) 只返回一行，最大倍数和最高市值由 SQLite 聚合
             query = """
-            WITH hourly_tokens AS (
-                SELECT 
-                    strftime('%H', mt.created_at) as hour,
-                    mt.token,
-                    mt.ca,
-                    ma.multiple,
-                    ma.max_market_cap
-                FROM monitored_tokens mt
-                LEFT JOIN multiple_alerts ma ON mt.ca = ma.ca
-                WHERE mt.created_at BETWEEN ? AND ?
-            )
             SELECT 
-                hour,
-                GROUP_CONCAT(token) as tokens,
-                GROUP_CONCAT(multiple) as multiples,
-                GROUP_CONCAT(max_market_cap) as market_caps
-            FROM hourly_tokens
-            GROUP BY hour
-            ORDER BY hour
+                mt.created_at_ts / 3600 % 24 as hour,
+                mt.token,
+                COALESCE(MAX(ma.multiple), 0),
+                COALESCE(MAX(ma.max_market_cap), 0)
+            FROM monitored_tokens mt
+            LEFT JOIN multiple_alerts ma ON mt.ca = ma.ca
+            WHERE mt.created_at_ts BETWEEN ? AND ?
+            GROUP BY hour, mt.token
             """
             
-            cursor.execute(query, (yesterday_utc.strftime('%Y-%m-%d %H:%M:%S'), 
-                                 now_utc.strftime('%Y-%m-%d %H:%M:%S')))
-            
-            # 初始化24小时的数据
-            hourly_stats = {f"{i:02d}": {"tokens": [], "multiples": [], "market_caps": []} 
-                          for i in range(24)}
-            
-            # 填充实际数据
-            for hour, tokens, multiples, market_caps in cursor.fetchall():
-                if tokens:  # 如果这个小时有代币
-                    tokens = tokens.split(',')
-                    multiples = [float(m) if m else 0 for m in (multiples.split(',') if multiples else [0] * len(tokens))]
-                    market_caps = [float(m) if m else 0 for m in (market_caps.split(',') if market_caps else [0] * len(tokens))]
-                    
-                    hourly_stats[hour] = {
-                        "tokens": tokens,
-                        "multiples": multiples,
-                        "market_caps": market_caps
-                    }
-            
-            return hourly_stats
+            cursor.execute(query, (int(yesterday_utc.timestamp()), int(now_utc.timestamp())))
+            return np.array(cursor.fetchall(), dtype=_STATS_DTYPE)
             
         finally:
-            conn.close()
+            cursor.close()
+
+    async def generate_report(self, report_day: datetime = None):
+        """生成统计报告
 
-    def generate_report(self):
-        """生成统计报告"""
+        report_day 为报告所属的日期，默认取当前时间的前一天
+        """
         stats = self.get_24h_stats()
         
-        # 获取统计的日期（当前时间的前一天）
-        report_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
-        report = f"\n=== 金狗创建统计报告 ({report_date}) ===\n"
+        if report_day is None:
+            report_day = datetime.now() - timedelta(days=1)
+        report_date = report_day.strftime('%Y-%m-%d')
+        parts = [f"\n=== 金狗创建统计报告 ({report_date}) ===\n"]
+        
+        # 向量化计算每个代币的条件，再按小时汇总
+        hours = stats['hour']
+        multiples = stats['multiple']
+        market_caps_m = stats['market_cap'] / 1_000_000
+        is_high_mcap = market_caps_m >= 4.2
+        is_gold = multiples >= 3
+        is_valid = is_gold | is_high_mcap  # 只显示符合条件的代币
         
-        # 计算每小时的收益和大市值代币数量
-        hourly_profits = {}
-        hourly_high_mcap_counts = {}
+        token_counts = np.bincount(hours, minlength=24)
+        # 每个代币只有一行，已是最大倍数，直接求和即为该小时总收益
+        profits = np.bincount(hours, weights=np.where(is_gold, multiples, 0), minlength=24)
+        high_mcap_counts = np.bincount(hours[is_high_mcap], minlength=24)
         
-        # 按小时显示详细统计
-        for hour, data in sorted(stats.items()):
-            if data["tokens"]:  # 只显示有创建记录的小时
-                # 将 UTC 时间转换为北京时间（+8小时）
-                beijing_hour = (int(hour) + 8) % 24
-                report += f"\n{beijing_hour:02d}时，创建{len(data['tokens'])}个代币"
-                
-                # 统计该小时的总收益和大市值代币数
-                profit = 0
-                high_mcap_count = 0
-                valid_tokens = []  # 存储符合条件的代币信息
-                
-                # 用于记录每个代币的最大倍数
-                token_max_multiple = {}  # 使用字典记录每个代币的最大倍数
-                
-                # 处理每个代币的详细信息
-                for token, multiple, market_cap in zip(data["tokens"], data["multiples"], data["market_caps"]):
-                    market_cap_m = market_cap / 1_000_000 if market_cap else 0
-                    
-                    # 统计大市值代币
-                    if market_cap_m >= 4.2:
-                        high_mcap_count += 1
-                    
-                    # 更新token的最大倍数
-                    if multiple >= 3:
-                        if token not in token_max_multiple or multiple > token_max_multiple[token]:
-                            token_max_multiple[token] = multiple
-                    
-                    # 只显示符合条件的代币
-                    if multiple >= 3 or market_cap_m >= 4.2:
-                        valid_tokens.append((token, multiple, market_cap_m))
-                
-                # 计算总收益（使用每个代币的最大倍数）
-                profit = sum(token_max_multiple.values())
-                
-                # 如果这个小时有代币但都不符合条件
-                if len(data["tokens"]) > 0 and not valid_tokens:
-                    report += "，均未超过4.2M"
-                
-                report += "\n"
-                
-                # 显示符合条件的代币详细信息
-                valid_tokens = sorted(valid_tokens, key=lambda x: (-x[1], x[0]))  # 按倍数降序排列
-                valid_tokens = list({t[0]: t for t in valid_tokens}.values())  # 按token去重，保留最高倍数
-                for token, multiple, market_cap_m in valid_tokens:
-                    report += f" - {token} {multiple:.1f}倍，最高市值{market_cap_m:.1f}M\n"
-                
-                if profit > 0:
-                    hourly_profits[hour] = profit
-                if high_mcap_count > 0:
-                    hourly_high_mcap_counts[hour] = high_mcap_count
+        hourly_profits = {hour: profits[hour] for hour in np.flatnonzero(profits)}
+        hourly_high_mcap_counts = {hour: high_mcap_counts[hour] for hour in np.flatnonzero(high_mcap_counts)}
+        
+        # 按小时显示详细统计（只显示有创建记录的小时）
+        for hour in np.flatnonzero(token_counts):
+            # 将 UTC 时间转换为北京时间（+8小时）
+            beijing_hour = _BEIJING_HOUR[hour]
+            parts.append(f"\n{beijing_hour}时，创建{token_counts[hour]}个代币")
+            
+            idx = np.flatnonzero(is_valid & (hours == hour))
+            
+            # 如果这个小时有代币但都不符合条件
+            if len(idx) == 0:
+                parts.append("，均未超过4.2M")
+            
+            parts.append("\n")
+            
+            # 显示符合条件的代币详细信息
+            valid_tokens = sorted(zip(stats['token'][idx], multiples[idx], market_caps_m[idx]),
+                                  key=lambda x: (-x[1], x[0]))  # 按倍数降序排列
+            for token, multiple, market_cap_m in valid_tokens:
+                parts.append(f" - {token} {multiple:.1f}倍，最高市值{market_cap_m:.1f}M\n")
         
         # 添加收益排名前5的时段
         if hourly_profits:
-            report += "\n24小时内金狗频繁出现在："
+            parts.append("\n24小时内金狗频繁出现在：")
             top_profits = sorted(hourly_profits.items(), key=lambda x: x[1], reverse=True)[:5]
-            for hour, profit in top_profits:
-                beijing_hour = (int(hour) + 8) % 24
-                report += f"{beijing_hour:02d}时({profit:.1f}倍收益)、"
-            report = report.rstrip('、') + "\n"
+            parts.append("、".join(f"{_BEIJING_HOUR[hour]}时({profit:.1f}倍收益)" for hour, profit in top_profits))
+            parts.append("\n")
         
         # 添加大市值代币数量排名前5的时段
         if hourly_high_mcap_counts:
-            report += "\n24小时大市值代币集中时段："
+            parts.append("\n24小时大市值代币集中时段：")
             top_mcaps = sorted(hourly_high_mcap_counts.items(), key=lambda x: x[1], reverse=True)[:5]
-            for hour, count in top_mcaps:
-                beijing_hour = (int(hour) + 8) % 24
-                report += f"{beijing_hour:02d}时({count}个)、"
-            report = report.rstrip('、') + "\n"
+            parts.append("、".join(f"{_BEIJING_HOUR[hour]}时({count}个)" for hour, count in top_mcaps))
+            parts.append("\n")
         
+        report = "".join(parts)
         print(report)
         
         # 保存报告到文件
@@ -175,26 +147,48 @@ class StatsAnalyzer:
             f.write(report)
             
         # 发送到飞书
-        self.send_to_feishu(report)
+        await self.send_to_feishu(report)
 
-def run_analysis():
+# 整个进程共用一个分析器，只读连接在进程生命周期内保持打开
+# （首次运行时再创建，避免 import 时数据库文件尚不存在）
+_ANALYZER = None
+
+async def run_analysis(report_day: datetime = None):
     """运行统计分析"""
-    analyzer = StatsAnalyzer()
-    analyzer.generate_report()
+    global _ANALYZER
+    if _ANALYZER is None:
+        _ANALYZER = StatsAnalyzer()
+    await _ANALYZER.generate_report(report_day)
 
-def main():
+def next_midnight() -> datetime:
+    """下一个本地时间 00:00"""
+    return (datetime.now() + timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+async def main_async():
     print("启动金狗创建频率统计服务...")
     
-    # 设置每天00:00运行
-    schedule.every().day.at("00:00").do(run_analysis)
-    
-    # 先运行一次
-    run_analysis()
-    
-    # 保持程序运行
-    while True:
-        schedule.run_pending()
-        time.sleep(60)
+    global _ANALYZER
+    try:
+        # 先运行一次
+        await run_analysis()
+        
+        # 每天00:00运行：目标时间只算一次，睡醒后按墙上时间确认已过零点，
+        # 系统时间被往回调时继续等待，保证每天只发一次报告
+        target = next_midnight()
+        while True:
+            while (now := datetime.now()) < target:
+                await asyncio.sleep((target - now).total_seconds())
+            await run_analysis(target - timedelta(days=1))
+            # 时间被往前调过多天时跳过错过的日期，不连续补发
+            target = max(target + timedelta(days=1), next_midnight())
+    finally:
+        # 退出或被取消时关闭飞书会话和只读连接
+        if _ANALYZER is not None:
+            await _ANALYZER.close()
+            _ANALYZER = None
+
+def main():
+    asyncio.run(main_async())
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
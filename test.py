@@ -5,8 +5,12 @@ valid_tokens = [
     ("TOKEN2", 3.0, 4.0)
 ]
 # 显示符合条件的代币详细信息
-valid_tokens = sorted(valid_tokens, key=lambda x: (-x[1], x[0]))  # 按倍数降序排列
-valid_tokens = list({t[0]: t for t in valid_tokens}.values())  # 按token去重，保留最高倍数
+best = {}  # 按token去重，保留最高倍数
+for token, multiple, market_cap_m in valid_tokens:
+    prev = best.get(token)
+    if prev is None or multiple > prev[0]:
+        best[token] = (multiple, market_cap_m)
+valid_tokens = sorted(((t, m, c) for t, (m, c) in best.items()), key=lambda x: (-x[1], x[0]))  # 按倍数降序排列
 
 print(valid_tokens)
 
@@ -1,14 +1,21 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import List
+from typing import Dict, List, Mapping
+from types import MappingProxyType
 from datetime import datetime, timedelta
 import asyncio
+import logging
+import queue
+import sys
 import time
-from requests_oauthlib import OAuth1Session
-import requests
-import json
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
+import httpx
+import orjson
+from aiolimiter import AsyncLimiter
+from oauthlib.oauth1 import Client as OAuth1Client
+from cachetools import TTLCache
 from db_operations import TokenDB
-from apscheduler.schedulers.background import BackgroundScheduler
 from okx_dex_api import OkxDexAPI
 
 app = FastAPI()
@@ -27,17 +34,51 @@ api_key_secret = os.getenv("TWITTER_API_KEY_SECRET")
 access_token = os.getenv("TWITTER_ACCESS_TOKEN")
 access_token_secret = os.getenv("TWITTER_ACCESS_TOKEN_SECRET")
 
-# 初始化Twitter OAuth
-oauth = OAuth1Session(
+# Twitter OAuth1 签名器：只生成 Authorization 头，请求通过共享的 HTTP 会话发送
+twitter_oauth = OAuth1Client(
     api_key,
     client_secret=api_key_secret,
     resource_owner_key=access_token,
     resource_owner_secret=access_token_secret
 )
+TWEET_URL = "https://api.twitter.com/2/tweets"
 
-# 创建调度器
-scheduler = BackgroundScheduler()
-scheduler.start()
+# 日志：业务代码只把记录放进队列，由 QueueListener 的线程写 stdout，不阻塞事件循环
+logger = logging.getLogger("dogg")
+logger.setLevel(logging.INFO)
+logger.propagate = False
+_log_queue = queue.SimpleQueue()
+logger.addHandler(QueueHandler(_log_queue))
+_log_handler = logging.StreamHandler(sys.stdout)
+_log_handler.setFormatter(logging.Formatter("%(asctime)s %(message)s", "%Y-%m-%d %H:%M:%S"))
+_log_listener = QueueListener(_log_queue, _log_handler)
+
+# 等待延迟发送的推文任务（保留引用，避免任务被垃圾回收）
+_pending_tweets = set()
+
+# DexScreener 代币接口，%s 处填一个或逗号分隔的多个 CA
+_DEX_URL_TMPL = "https://api.dexscreener.com/latest/dex/tokens/%s"
+
+# DexScreener 响应缓存：receive_token 刚请求过的 CA 在监控循环里可以直接复用
+_dex_cache = TTLCache(maxsize=4096, ttl=30)
+# 正在进行中的 DexScreener 请求（CA -> Task）
+_dex_inflight = {}
+
+def _slim_pair(pair: dict) -> dict:
+    """只保留后续用到的交易对字段，缓存里不留整份响应
+
+    嵌套字段可能缺失也可能为 null，统一按空字典处理
+    """
+    return {
+        'priceUsd': pair.get('priceUsd', '0'),
+        'priceNative': pair.get('priceNative', 0),
+        'volume': {'h24': (pair.get('volume') or {}).get('h24', 0)},
+        'fdv': pair.get('fdv', 0),
+        'marketCap': pair.get('marketCap', 0),
+        'liquidity': {'usd': (pair.get('liquidity') or {}).get('usd', 0)},
+        'pairCreatedAt': pair.get('pairCreatedAt', 0),
+        'info': {'socials': (pair.get('info') or {}).get('socials') or []}
+    }
 
 class TokenData(BaseModel):
     token: str
@@ -46,52 +87,152 @@ class TokenData(BaseModel):
     date: str
     sourceType: List[str]
 
+# 市值单位查表：按末尾字符的 ASCII 码（| 0x20 转小写）取倍数，其他字符为 1
+_MCAP_UNIT = [1.0] * 256
+_MCAP_UNIT[ord('k')] = 1e3
+_MCAP_UNIT[ord('m')] = 1e6
+_MCAP_UNIT[ord('b')] = 1e9
+
+@lru_cache(maxsize=1024)
 def parse_market_cap(mcap_str: str) -> float:
     """解析市值字符串为数字"""
     try:
-        number = float(mcap_str[:-1])
-        unit = mcap_str[-1].upper()
-        multipliers = {'K': 1e3, 'M': 1e6, 'B': 1e9}
-        return number * multipliers.get(unit, 1)
-    except:
+        unit = _MCAP_UNIT[ord(mcap_str[-1]) | 0x20]
+        return float(mcap_str[:-1] if unit != 1.0 else mcap_str) * unit
+    except (ValueError, IndexError):
         return 0.0
 
-def fetch_dexscreener_data(token_address: str) -> dict:
-    """从DexScreener获取代币数据"""
-    try:
-        url = f"https://api.dexscreener.com/latest/dex/tokens/{token_address}"
-        response = requests.get(
-            url,
-            headers={
-                "Accept": "application/json",
-                "User-Agent": "Mozilla/5.0"
-            },
-            timeout=10
-        )
-        
-        if response.status_code == 200:
-            return response.json()
-        else:
-            print(f"请求失败: HTTP {response.status_code}")
+async def _request_dexscreener(session: httpx.AsyncClient, token_address: str) -> dict:
+    """从DexScreener获取代币数据（token_address 可以是逗号分隔的多个地址）
+
+    遇到限流/服务端错误或网络错误时按指数退避重试 DEX_RETRIES 次
+    """
+    url = _DEX_URL_TMPL % token_address
+    for attempt in range(DEX_RETRIES + 1):
+        try:
+            response = await session.get(url)
+            if response.status_code == 200:
+                return orjson.loads(response.content)
+            if response.status_code not in DEX_RETRY_STATUSES or attempt == DEX_RETRIES:
+                logger.warning("请求失败: HTTP %s", response.status_code)
+                return None
+        except httpx.TransportError as e:
+            if attempt == DEX_RETRIES:
+                logger.warning("获取DexScreener数据失败: %s", e)
+                return None
+        except Exception as e:
+            logger.warning("获取DexScreener数据失败: %s", e)
             return None
-            
-    except Exception as e:
-        print(f"获取DexScreener数据失败: {str(e)}")
+        await asyncio.sleep(DEX_BACKOFF * 2 ** attempt)
+
+async def _load_dexscreener(session: httpx.AsyncClient, token_address: str) -> Mapping:
+    """请求DexScreener并缓存成功的结果（失败不缓存，下次重新请求）
+
+    只用到第一个交易对，解码后立即裁剪，其余数据随响应一起释放
+    """
+    data = await _request_dexscreener(session, token_address)
+    if data is None:
+        return None
+    try:
+        data = MappingProxyType({'pairs': [_slim_pair(pair) for pair in (data.get('pairs') or [])[:1]]})
+    except (AttributeError, TypeError) as e:
+        logger.warning("DexScreener数据格式异常 %s: %s", token_address, e)
         return None
+    _dex_cache[token_address] = data
+    return data
+
+async def fetch_dexscreener_data(session: httpx.AsyncClient, token_address: str) -> Mapping:
+    """获取代币数据，优先使用缓存；同一 CA 的并发调用共用一次请求
+
+    返回只读视图，调用方不要修改其内容
+    """
+    cached = _dex_cache.get(token_address)
+    if cached is not None:
+        return cached
+    task = _dex_inflight.get(token_address)
+    if task is None:
+        task = asyncio.create_task(_load_dexscreener(session, token_address))
+        _dex_inflight[token_address] = task
+        task.add_done_callback(lambda _: _dex_inflight.pop(token_address, None))
+    # shield：某个调用方被取消时不影响其他等待同一请求的调用方
+    return await asyncio.shield(task)
+
+async def _load_dexscreener_batch(session: httpx.AsyncClient, cas: List[str]) -> Dict[str, Mapping]:
+    """用批量接口请求一组代币，按 baseToken.address 拆分结果并写入缓存
+
+    每个 CA 只保留响应中的第一个交易对
+    """
+    data = await _request_dexscreener(session, ','.join(cas))
+    if data is None:
+        return {}
+    wanted = set(cas)
+    grouped = {}
+    for pair in data.get('pairs') or []:
+        # 单个交易对格式异常时只跳过它，不影响同一批的其他代币
+        try:
+            ca = (pair.get('baseToken') or {}).get('address')
+            if ca in wanted and ca not in grouped:
+                grouped[ca] = _slim_pair(pair)
+        except (AttributeError, TypeError) as e:
+            logger.warning("跳过格式异常的交易对: %s", e)
+    results = {}
+    for ca, pair in grouped.items():
+        results[ca] = _dex_cache[ca] = MappingProxyType({'pairs': [pair]})
+    return results
+
+async def fetch_dexscreener_batch(session: httpx.AsyncClient, cas: List[str]) -> Dict[str, Mapping]:
+    """批量获取多个代币的数据，返回 CA -> 数据（没有数据的 CA 不在结果中）
+
+    已缓存的 CA 直接复用，其余每 DEX_BATCH_SIZE 个合并成一次请求；
+    批量响应里没有出现的 CA（响应的交易对数量有上限，或该 CA 只作为 quoteToken 出现）再逐个单独请求
+    """
+    results = {}
+    missing = []
+    for ca in cas:
+        cached = _dex_cache.get(ca)
+        if cached is not None:
+            results[ca] = cached
+        else:
+            missing.append(ca)
+    
+    semaphore = asyncio.Semaphore(DEX_CONCURRENCY)
+    
+    async def bounded_load(batch: List[str]) -> Dict[str, Mapping]:
+        async with semaphore:
+            return await _load_dexscreener_batch(session, batch)
+    
+    async def bounded_fetch(ca: str) -> Mapping:
+        async with semaphore:
+            return await fetch_dexscreener_data(session, ca)
     
-def parse_dexscreener_data(response_json: str) -> dict:
-    """解析DexScreener API的响应数据"""
+    batches = [missing[i:i + DEX_BATCH_SIZE] for i in range(0, len(missing), DEX_BATCH_SIZE)]
+    # 某一批出错时只丢掉这一批，其余批次的结果照常返回
+    for batch_results in await asyncio.gather(*(bounded_load(batch) for batch in batches), return_exceptions=True):
+        if isinstance(batch_results, Exception):
+            logger.warning("批量获取DexScreener数据失败: %s", batch_results)
+            continue
+        results.update(batch_results)
+    
+    absent = [ca for ca in missing if ca not in results]
+    if absent:
+        logger.info("批量响应中缺少 %d 个代币，逐个补充请求", len(absent))
+        for ca, data in zip(absent, await asyncio.gather(*(bounded_fetch(ca) for ca in absent), return_exceptions=True)):
+            if isinstance(data, Mapping) and data.get('pairs'):
+                results[ca] = data
+    return results
+    
+def parse_dexscreener_data(data: Mapping) -> dict:
+    """解析DexScreener API的响应数据（已解码的 JSON）"""
     try:
-        data = json.loads(response_json)
         if not data.get('pairs'):
-            print("没有找到pairs数据")
+            logger.warning("没有找到pairs数据")
             return None
             
         first_pair = data['pairs'][0]
         
         # 基本信息
-        price_usd = first_pair.get('priceUsd', '0')
-        pair_created_at = first_pair.get('pairCreatedAt', 0)
+        price_usd = first_pair.get('priceUsd') or '0'
+        pair_created_at = first_pair.get('pairCreatedAt') or 0
         
         # 社交媒体信息（可能不存在）
         social_links = {}
@@ -106,13 +247,15 @@ def parse_dexscreener_data(response_json: str) -> dict:
         return {
             'price_usd': float(price_usd),
             'created_time': created_time,
+            'created_ts': pair_created_at // 1000,  # Unix 秒，供计算代币年龄使用
             'socials': social_links
         }
         
     except Exception as e:
-        print(f"解析DexScreener数据时出错: {str(e)}")
+        logger.error("解析DexScreener数据时出错: %s", e)
         return None
     
+@lru_cache(maxsize=1024)
 def format_number(num: float) -> str:
     """
     格式化数字为K/M表示
@@ -128,30 +271,22 @@ def format_number(num: float) -> str:
     else:
         return f"{num/1000000:.2f}M"
 
-def format_tweet_text(data: TokenData | dict, dex_data: dict, multiple: float = None) -> str:
-    """格式化推文内容"""
-    if multiple is not None:
-        # 计算创建时间到现在的间隔
-        created_time = datetime.strptime(dex_data['created_time'], '%Y-%m-%d %H:%M:%S')
-        time_diff = datetime.now() - created_time
-        days = time_diff.days
-        hours = time_diff.seconds // 3600
-        
-        social_links = f"𝕏 @{dex_data['socials']['twitter'].replace('https://x.com/', '')}" if 'twitter' in dex_data['socials'] else ""
-        
-        return f"""🚀 DOGG 金狗Call 推荐后的收益回溯 ${data['token']} 
+# 推文模板：可变部分用 format_map 填充，固定的引流/价格/标签文本只创建一次
+_TWEET_HEAD = """🚀 DOGG 金狗Call 推荐后的收益回溯 ${token} 
 {social_links}
-🔥 经频道推送后市值上涨 {(multiple-1)*100:.0f}% 💹
-⏱️ 推送时间: {data['received_time']}
-💰 金狗推送 VIP无延时群推送市值: {format_number(data['initial_mcap'])}
-💰 当前市值: {format_number(data['initial_mcap'] * multiple)}
-💵 价格: ${dex_data['price_usd']:.8f}
+🔥 经频道推送后市值上涨 {pct:.0f}% 💹
+⏱️ 推送时间: {received_time}
+💰 金狗推送 VIP无延时群推送市值: {initial_mcap}
+💰 当前市值: {current_mcap}
+💵 价格: ${price_usd:.8f}
 
-📝 CA: {data['ca']}
+📝 CA: {ca}
 
 ⏰ 代币创建时间: {days}天{hours}小时前
 
-进入DOGG金狗Call免费版邀请链接：https://applink.feishu.cn/client/chat/chatter/add_by_link?link_token=cf2sa554-bcbf-4982-9f18-7d96dc8c94fe
+"""
+
+_TWEET_CONST_TAIL = """进入DOGG金狗Call免费版邀请链接：https://applink.feishu.cn/client/chat/chatter/add_by_link?link_token=cf2sa554-bcbf-4982-9f18-7d96dc8c94fe
 无延迟版咨询tg客服 @qingdaii
 
 无延时VIP群价格：
@@ -166,120 +301,165 @@ SOL 收款钱包：
 
 本推文由程序自动统计并发布，不可作为任何投资参考！
 
-#SOLANA #MEMECOIN #PUMPFUN #{data['token']} """
+#SOLANA #MEMECOIN #PUMPFUN #"""
+
+def _format_social_links(socials: dict) -> str:
+    """推文中的社交媒体行"""
+    if 'twitter' in socials:
+        return f"𝕏 @{socials['twitter'].replace('https://x.com/', '')}"
+    return ""
+
+def format_tweet_text(data: TokenData | dict, dex_data: dict, multiple: float = None) -> str:
+    """格式化推文内容"""
+    if multiple is not None:
+        # 计算创建时间到现在的间隔
+        days, seconds = divmod(int(time.time()) - dex_data['created_ts'], 86400)
+        hours = seconds // 3600
+        
+        head = _TWEET_HEAD.format_map({
+            'token': data['token'],
+            'social_links': _format_social_links(dex_data['socials']),
+            'pct': (multiple - 1) * 100,
+            'received_time': data['received_time'],
+            'initial_mcap': format_number(data['initial_mcap']),
+            'current_mcap': format_number(data['initial_mcap'] * multiple),
+            'price_usd': dex_data['price_usd'],
+            'ca': data['ca'],
+            'days': days,
+            'hours': hours,
+        })
+        return head + _TWEET_CONST_TAIL + data['token'] + " "
     else:
         # 首次推文（现在不用了）
         return ""
 
-def send_tweet(text: str) -> bool:
+async def send_tweet(text: str) -> bool:
     """发送推文"""
-    print(f"推文内容:\n{text}")
+    logger.info("推文内容:\n%s", text)
     try:
-        response = oauth.post(
-            "https://api.twitter.com/2/tweets",
-            json={"text": text}
-        )
-        
+        # JSON 请求体不参与 OAuth1 签名
+        _, headers, _ = twitter_oauth.sign(TWEET_URL, http_method="POST")
+        response = await app.state.http.post(TWEET_URL, json={"text": text}, headers=headers)
         if response.status_code != 201:
-            print(f"发推失败: {response.status_code} {response.text}")
+            logger.error("发推失败: %s %s", response.status_code, response.text)
             return False
-            
-        print(f"发推成功！")
+        
+        logger.info("发推成功！")
         return True
         
     except Exception as e:
-        print(f"发推出错: {str(e)}")
+        logger.error("发推出错: %s", e)
         return False
 
 # 常量定义
 MULTIPLES = [5, 10, 20, 50, 100]  # 监控的倍数列表
 TWEET_INTERVAL = 10  # 每次发推文之间的间隔（秒），这里是10s
+MONITOR_INTERVAL = 120  # 每轮价格检查的周期（秒）
+DEX_CONCURRENCY = 20  # 同时请求DexScreener的最大并发数
+DEX_BATCH_SIZE = 30  # DexScreener批量接口每次最多查询的地址数
+DEX_RETRIES = 3  # DexScreener请求失败后的最大重试次数
+DEX_BACKOFF = 0.3  # 重试退避基数（秒），第 n 次重试前等待 DEX_BACKOFF * 2**n
+DEX_RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+HTTP_MAX_CONNECTIONS = 64  # 共享HTTP客户端的最大连接数
+HTTP_KEEPALIVE = 32  # 共享HTTP客户端保留的空闲长连接数
+
+# 发推限流：每 TWEET_INTERVAL 秒最多安排一条，超出时等待而不是丢弃提醒
+tweet_limiter = AsyncLimiter(1, TWEET_INTERVAL)
+
+async def _delayed_send(text: str, delay: float):
+    """等待 delay 秒后发送推文"""
+    await asyncio.sleep(delay)
+    await send_tweet(text)
 
 def schedule_tweet(text: str, delay_minutes: int = 30):
     """安排延迟发送推文"""
-    current_time = datetime.now()
-    target_time = current_time + timedelta(minutes=delay_minutes)
-    
-    print(f"\n=== {current_time.strftime('%Y-%m-%d %H:%M:%S')} ===")
-    print(f"推文已加入发送队列")
-    print(f"预计发送时间: {target_time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"推文内容:\n{text}")
+    # 当前时间由日志格式化器输出；datetime 只在日志真正输出时才转成字符串
+    target_time = datetime.now().replace(microsecond=0) + timedelta(minutes=delay_minutes)
+    logger.info("推文已加入发送队列，预计发送时间: %s", target_time)
+    logger.info("推文内容:\n%s", text)
     
     # 安排任务
-    scheduler.add_job(
-        send_tweet,
-        'date',
-        run_date=target_time,
-        args=[text]
-    )
+    task = asyncio.create_task(_delayed_send(text, delay_minutes * 60))
+    _pending_tweets.add(task)
+    task.add_done_callback(_pending_tweets.discard)
 
 async def monitor_token_price():
     """监控代币价格的后台任务"""
-    print("开始监控代币价格...")
-    last_tweet_time = 0
+    logger.info("开始监控代币价格...")
+    session = app.state.http
+    loop = asyncio.get_running_loop()
     
     while True:
-        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        cycle_start = loop.time()
         try:
-            print(f"\n=== {current_time} 开始新一轮检查 ===")
+            logger.info("=== 开始新一轮检查 ===")
             
             try:
                 tokens = await db.get_all_tokens()
-                print(f"{current_time} 当前监控的代币数量: {len(tokens)}")
+                logger.info("当前监控的代币数量: %d", len(tokens))
             except Exception as e:
-                print(f"{current_time} ❌ 获取代币列表失败: {str(e)}")
+                logger.error("❌ 获取代币列表失败: %s", e)
                 raise
             
+            # 批量获取所有代币的DexScreener数据
+            results = await fetch_dexscreener_batch(session, [token['ca'] for token in tokens])
+            
+            pending_prices = []
             for token in tokens:
                 try:
-                    print(f"\n{current_time} 检查代币: {token['token']}")
-                    dex_data = fetch_dexscreener_data(token['ca'])
+                    logger.info("检查代币: %s", token['token'])
+                    dex_data = results.get(token['ca'])
                     if not dex_data:
-                        print(f"{current_time} 获取{token['token']}的DexScreener数据失败")
+                        logger.warning("获取%s的DexScreener数据失败", token['token'])
                         continue
                     
-                    # 添加价格记录
-                    await db.add_price_record(token['ca'], dex_data)
+                    # 价格记录先收集起来，本轮结束后一次性写入；单条记录出错不影响后面的倍数检查
+                    try:
+                        pending_prices.append(db.price_row(token['ca'], dex_data))
+                    except Exception as e:
+                        logger.error("❌ 记录%s价格数据时出错: %s", token['token'], e)
 
                     current_mcap = dex_data['pairs'][0]['fdv']
                     multiple = current_mcap / token['initial_mcap']
-                    print(f"{current_time} 当前市值: {current_mcap}, 涨幅倍数: {multiple:.2f}x")
+                    logger.info("当前市值: %s, 涨幅倍数: %.2fx", current_mcap, multiple)
                     
-                    for target_multiple in MULTIPLES:
-                        if multiple >= target_multiple:
-                            try:
-                                if not await db.check_multiple_alerted(token['ca'], target_multiple):
-                                    current_timestamp = time.time()
-                                    if current_timestamp - last_tweet_time < TWEET_INTERVAL:
-                                        wait_time = int(TWEET_INTERVAL - (current_timestamp - last_tweet_time))
-                                        print(f"{current_time} 距离上次发推未满{TWEET_INTERVAL}秒，等待{wait_time}秒...")
-                                        continue
-                                    
-                                    print(f"{current_time} 达到{target_multiple}倍目标，准备发送提醒")
-                                    parsed_dex_data = parse_dexscreener_data(json.dumps(dex_data))
-                                    if parsed_dex_data:
-                                        tweet_text = format_tweet_text(token, parsed_dex_data, multiple)
-                                        # 修改这里：使用延迟发送而不是直接发送
-                                        schedule_tweet(tweet_text, delay_minutes=30)
-                                        await db.record_multiple_alert(token['ca'], target_multiple, current_mcap)
-                                        last_tweet_time = time.time()
-                                        print(f"{current_time} ✅ 已安排{target_multiple}倍提醒: {token['token']}")
-                            except Exception as e:
-                                print(f"{current_time} ❌ 处理倍数提醒时出错: {str(e)}")
-                                continue
+                    # 同一轮跨过多个倍数时只发一条推文（对应最高的倍数），其余倍数只记录
+                    try:
+                        new_targets = [m for m in MULTIPLES
+                                       if multiple >= m and not db.check_multiple_alerted(token['ca'], m)]
+                        if new_targets:
+                            target_multiple = new_targets[-1]
+                            logger.info("达到%s倍目标，准备发送提醒", target_multiple)
+                            parsed_dex_data = parse_dexscreener_data(dex_data)
+                            if parsed_dex_data:
+                                tweet_text = format_tweet_text(token, parsed_dex_data, multiple)
+                                # 距离上次发推未满 TWEET_INTERVAL 秒时在这里等待
+                                async with tweet_limiter:
+                                    # 修改这里：使用延迟发送而不是直接发送
+                                    schedule_tweet(tweet_text, delay_minutes=30)
+                                for m in new_targets:
+                                    await db.record_multiple_alert(token['ca'], m, current_mcap)
+                                logger.info("✅ 已安排%s倍提醒: %s", target_multiple, token['token'])
+                    except Exception as e:
+                        logger.error("❌ 处理倍数提醒时出错: %s", e)
                 except Exception as e:
-                    print(f"{current_time} ❌ 处理代币 {token['token']} 时出错: {str(e)}")
+                    logger.error("❌ 处理代币 %s 时出错: %s", token['token'], e)
                     continue
             
-            print(f"\n{current_time} 等待120秒后进行下一轮检查...")
+            # 本轮所有价格记录在一个事务内写入
+            await db.add_price_records_bulk(pending_prices)
             
         except Exception as e:
-            print(f"{current_time} ❌ 监控任务出错: {str(e)}")
+            logger.error("❌ 监控任务出错: %s", e)
         
+        # 扣除本轮耗时，保持固定的检查周期
+        delay = max(0, MONITOR_INTERVAL - (loop.time() - cycle_start))
+        logger.info("等待%.0f秒后进行下一轮检查...", delay)
         try:
-            await asyncio.sleep(120)
-        except Exception as e:
-            print(f"{current_time} ❌ sleep 出错: {str(e)}")
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            logger.info("停止监控代币价格")
+            raise
 
 async def check_tokens(ca: str):
     """检查特定代币的购买报价并记录
@@ -287,10 +467,10 @@ async def check_tokens(ca: str):
     Args:
         ca: 代币的合约地址
     """
-    okx_api = OkxDexAPI()
+    okx_api = app.state.okx
     
     try:
-        print(f"\n获取代币 {ca} 的购买报价")
+        logger.info("获取代币 %s 的购买报价", ca)
         # 获取报价
         quote_result = await okx_api.get_quote(
             chain_id=501,
@@ -302,50 +482,50 @@ async def check_tokens(ca: str):
         if quote_result.get('code') == '0':
             # 记录购买信息
             await db.add_purchase_record(quote_result, ca)
-            print(f"✅ 成功记录购买信息: {ca}")
+            logger.info("✅ 成功记录购买信息: %s", ca)
             return quote_result
         else:
-            print(f"❌ 获取报价失败: {quote_result.get('msg', '未知错误')}")
+            logger.warning("❌ 获取报价失败: %s", quote_result.get('msg', '未知错误'))
             return None
             
     except Exception as e:
-        print(f"获取代币 {ca} 报价时出错: {str(e)}")
+        logger.error("获取代币 %s 报价时出错: %s", ca, e)
         return None
 
 @app.post("/receive_token")
 async def receive_token(data: TokenData):
     try:
         # 1. 打印接收到的原始数据
-        print("\n=== 开始处理新请求 ===")
-        print(f"接收到的数据: {data.dict()}")
+        logger.info("=== 开始处理新请求 ===")
+        logger.info("接收到的数据: %s", data.dict())
         
         # 2. 获取DexScreener数据
-        print("\n正在获取DexScreener数据...")
-        dex_raw_data = fetch_dexscreener_data(data.ca)
+        logger.info("正在获取DexScreener数据...")
+        dex_raw_data = await fetch_dexscreener_data(app.state.http, data.ca)
         if not dex_raw_data:
-            print("❌ 获取DexScreener数据失败")
+            logger.warning("❌ 获取DexScreener数据失败")
             return {
                 "status": "error",
                 "message": "获取DexScreener数据失败"
             }
-        print("✅ 成功获取DexScreener数据")
+        logger.info("✅ 成功获取DexScreener数据")
         
         # 3. 解析DexScreener数据并存入数据库
-        print("\n正在解析DexScreener数据...")
-        dex_data = parse_dexscreener_data(json.dumps(dex_raw_data))
+        logger.info("正在解析DexScreener数据...")
+        dex_data = parse_dexscreener_data(dex_raw_data)
         if not dex_data:
-            print("❌ 解析DexScreener数据失败")
+            logger.warning("❌ 解析DexScreener数据失败")
             return {
                 "status": "error",
                 "message": "解析DexScreener数据失败"
             }
-        print(f"✅ 解析结果: {dex_data}")
+        logger.info("✅ 解析结果: %s", dex_data)
         
         # 4. 存入数据库
         mcap = parse_market_cap(data.marketCap)
         if mcap > 0:
             if await db.add_token(data.token, data.ca, mcap, data.date, data.sourceType):
-                print(f"添加到数据库: {data.token}")
+                logger.info("添加到数据库: %s", data.token)
 
         # 5. 获取 OKX DEX 报价并记录
         quote_result = await check_tokens(data.ca)
@@ -359,7 +539,7 @@ async def receive_token(data: TokenData):
         }
         
     except Exception as e:
-        print(f"\n❌ 发生错误: {str(e)}")
+        logger.error("❌ 发生错误: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"处理数据时出错: {str(e)}"
@@ -376,13 +556,31 @@ async def view_monitored_tokens():
 
 @app.on_event("startup")
 async def startup_event():
+    _log_listener.start()
     await db.init_db()
-    asyncio.create_task(monitor_token_price())
+    # DexScreener 和 Twitter 请求共用一个连接池；HTTP/2 下同一主机的并发请求复用一条连接（需要安装 httpx[http2]）
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=10.0,
+        limits=httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=HTTP_KEEPALIVE),
+        headers={
+            "Accept": "application/json",
+            "User-Agent": "Mozilla/5.0"
+        }
+    )
+    # OKX DEX 客户端只创建一次，所有请求共用
+    app.state.okx = OkxDexAPI()
+    app.state.monitor_task = asyncio.create_task(monitor_token_price())
 
-# 在程序退出时关闭调度器
+# 在程序退出时停止监控、取消未发送的推文，关闭HTTP会话、数据库连接和日志线程
 @app.on_event("shutdown")
 async def shutdown_event():
-    scheduler.shutdown()
+    app.state.monitor_task.cancel()
+    for task in _pending_tweets:
+        task.cancel()
+    await app.state.http.aclose()
+    await db.close()
+    _log_listener.stop()
 
 
 